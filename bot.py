@@ -1,14 +1,17 @@
-# ================== DEBUG ==================
-import sys
-print("PYTHON:", sys.version)
-print("🚀 Starting Medicine Inventory Bot...")
-
 # ================== STANDARD IMPORTS ==================
+import asyncio
 import logging
 import os
+import sys
+import weakref
 
-# ================== FUZZY MATCHING ==================
-from thefuzz import fuzz
+# ================== EVENT LOOP ==================
+# uvloop is Linux/macOS only; Windows dev setups keep the default asyncio loop
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
 
 # ================== TELEGRAM IMPORTS ==================
 from telegram import (
@@ -19,6 +22,7 @@ from telegram import (
 )
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     ContextTypes,
@@ -42,6 +46,8 @@ logging.basicConfig(
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
+logger.info("PYTHON: %s", sys.version)
+logger.info("🚀 Starting Medicine Inventory Bot...")
 
 # ================== INITIALIZE ==================
 db = InventoryDatabase()
@@ -60,33 +66,35 @@ MAIN_KEYBOARD = ReplyKeyboardMarkup(
     resize_keyboard=True
 )
 
+# ================== MESSAGES ==================
+START_TEMPLATE = (
+    "💊 *Medicine Inventory Bot*\n\n"
+    "📦 Medicines in database: *{med_count}*\n\n"
+    "*How to use:*\n"
+    "• Upload Excel/CSV to import stock\n"
+    "• Send sales like:\n"
+    "`crocin 10 150`\n"
+    "`dolo 5 125`\n\n"
+    "Use buttons below 👇"
+)
+
+HELP_TEXT = "❓ Help\n\nUpload Excel or send sales text."
+
 # ================== AUTHORIZATION (FIXED) ==================
 def is_authorized(user_id: int) -> bool:
     return True   # 🔥 TEMPORARY: allow everyone
 
 # ================== COMMAND HANDLERS ==================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    med_count = db.get_medicine_count()
-    text = (
-        "💊 *Medicine Inventory Bot*\n\n"
-        f"📦 Medicines in database: *{med_count}*\n\n"
-        "*How to use:*\n"
-        "• Upload Excel/CSV to import stock\n"
-        "• Send sales like:\n"
-        "`crocin 10 150`\n"
-        "`dolo 5 125`\n\n"
-        "Use buttons below 👇"
-    )
-
     await update.message.reply_text(
-        text,
+        START_TEMPLATE.format(med_count=db.get_medicine_count()),
         parse_mode="Markdown",
         reply_markup=MAIN_KEYBOARD
     )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
-        "❓ Help\n\nUpload Excel or send sales text.",
+        HELP_TEXT,
         parse_mode="Markdown"
     )
 
@@ -97,9 +105,56 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("📝 Message received")
 
+# ================== UPDATE PROCESSING ==================
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Handle updates from different chats concurrently, one at a time per chat."""
+
+    # The base class semaphore is held while an update waits for its chat lock,
+    # so it only serves as a backstop; the real limit is self._slots below
+    BACKSTOP_LIMIT = 4096
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(self.BACKSTOP_LIMIT)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # Locks disappear once no pending update of that chat holds a reference
+        self._chat_locks = weakref.WeakValueDictionary()
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lock = self._chat_locks.get(chat.id)
+        if lock is None:
+            lock = self._chat_locks[chat.id] = asyncio.Lock()
+        # Take the chat lock before a slot, so updates queued behind a slow
+        # handler in one chat don't hold slots other chats could use
+        async with lock:
+            async with self._slots:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+# ================== LIFECYCLE ==================
+async def on_shutdown(application: Application):
+    db.flush()
+
 # ================== MAIN ==================
 def main():
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(32))
+        .http_version("2")
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
@@ -109,7 +164,13 @@ def main():
     report_scheduler.setup(application.bot, db, excel_handler)
     report_scheduler.start()
 
-    application.run_polling()
+    # Long polling: Telegram holds each getUpdates open for up to 30s,
+    # so an idle bot makes ~2 requests/minute instead of a tight loop
+    application.run_polling(
+        timeout=30,
+        poll_interval=1.0,
+        allowed_updates=Update.ALL_TYPES
+    )
 
 # ================== ENTRY ==================
 if __name__ == "__main__":
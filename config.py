@@ -2,12 +2,13 @@ import os
 
 # TELEGRAM SETTINGS
 BOT_TOKEN = "YOUR_BOT_TOKEN_HERE"
-AUTHORIZED_USERS = []  # Add authorized Telegram user IDs here (e.g., [123456789])
+AUTHORIZED_USERS = frozenset()  # Add authorized Telegram user IDs here (e.g., frozenset({123456789}))
 
 # INVENTORY SETTINGS
 DEFAULT_MIN_STOCK = 20
 LOW_STOCK_THRESHOLD = 1.5  # multiply with min_stock to get warning level
 CRITICAL_STOCK_THRESHOLD = 5
+SAVE_DEBOUNCE_SECONDS = 0.2  # inventory changes within this window are saved in one write
 
 # FILE PATHS
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -1,18 +1,48 @@
 # force rebuild
+import asyncio
+import functools
+import heapq
 import json
+import logging
+import math
 import os
+import shutil
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Tuple
-from thefuzz import fuzz, process
+from typing import Optional, List, Dict, Set, Tuple
+import orjson
+from rapidfuzz import fuzz, process, utils
 
 import pandas as pd
-from config import INVENTORY_FILE, DEFAULT_MIN_STOCK, LOW_STOCK_THRESHOLD, CRITICAL_STOCK_THRESHOLD
+from config import (
+    INVENTORY_FILE, DEFAULT_MIN_STOCK, LOW_STOCK_THRESHOLD, CRITICAL_STOCK_THRESHOLD,
+    SAVE_DEBOUNCE_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Marks a blank cell in an optional column; _numeric_cell returns the caller's default for it
+_MISSING = object()
 
 class InventoryDatabase:
     # --- INITIALIZATION ---
     def __init__(self):
         self.inventory_file = INVENTORY_FILE
         self.medicines: List[Dict] = []
+        self._name_list: List[str] = []
+        self._by_search_name: Dict[str, Dict] = {}
+        self._by_id: Dict[int, Dict] = {}
+        self._status: Dict[int, str] = {}
+        self._low_stock_ids: Set[int] = set()
+        self._next_id = 1
+        self._find_cached = functools.lru_cache(maxsize=512)(self._match_index)
+        self._dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_depth = 0
+        self._write_lock = threading.Lock()
+        self._save_seq = 0
+        self._written_seq = 0
         self.load_database()
 
     # --- FILE OPERATIONS ---
@@ -20,27 +50,139 @@ class InventoryDatabase:
         """Load medicines from JSON file if exists."""
         if os.path.exists(self.inventory_file):
             try:
-                with open(self.inventory_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(self.inventory_file, 'rb') as f:
+                    data = self._parse_file(f.read())
                     self.medicines = data.get('medicines', [])
-            except (json.JSONDecodeError, FileNotFoundError):
+            except FileNotFoundError:
+                self.medicines = []
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                # Keep the unreadable file aside: the next save would otherwise replace it with an empty list
+                backup = f"{self.inventory_file}.corrupt"
+                shutil.copy2(self.inventory_file, backup)
+                logger.error("Could not parse %s (%s); starting empty, original kept at %s", self.inventory_file, e, backup)
                 self.medicines = []
         else:
             self.medicines = []
+        self._rebuild_index()
+
+    def _parse_file(self, raw: bytes) -> Dict:
+        """Parse inventory.json, accepting the NaN values older json.dump-written files may contain."""
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            data = json.loads(raw)
+
+        # orjson would write NaN back out as null; store the import default instead
+        for med in data.get('medicines', []):
+            price = med.get('price')
+            if isinstance(price, float) and not math.isfinite(price):
+                med['price'] = 0.0
+        return data
 
-    def save_database(self):
-        """Save medicines to JSON file with updated_at timestamp."""
+    def save_database(self, pretty: bool = False):
+        """Save medicines to JSON file with updated_at timestamp (compact unless pretty=True)."""
+        self._dirty = False
+        self._write_file(*self._serialize(pretty))
+
+    def _serialize(self, pretty: bool = False) -> Tuple[bytes, int]:
+        """Snapshot the database as JSON bytes, tagged with a save sequence number."""
         data = {
             'updated_at': datetime.now().isoformat(),
             'medicines': self.medicines
         }
-        with open(self.inventory_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        option = orjson.OPT_INDENT_2 if pretty else None
+        self._save_seq += 1
+        return orjson.dumps(data, option=option), self._save_seq
+
+    def _write_file(self, payload: bytes, seq: int):
+        """Write a snapshot unless a newer one has already reached the disk."""
+        with self._write_lock:
+            if seq <= self._written_seq:
+                return
+            # Write to a temp file and swap it in so a crash never leaves a torn file
+            tmp_path = f"{self.inventory_file}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.inventory_file)
+            self._written_seq = seq
+
+    @contextmanager
+    def batch(self):
+        """Group several mutations (e.g. one multi-line sales message) into a single save."""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self._schedule_save()
+
+    def _mark_dirty(self):
+        """Record an unsaved change; the write is deferred to the end of any open batch."""
+        self._dirty = True
+        if self._batch_depth == 0:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        """Save now, or debounce the write when called from inside the event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop (e.g. a standalone script): save straight away
+            self.save_database()
+            return
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        """Coalesce changes made within SAVE_DEBOUNCE_SECONDS into one write off the event loop."""
+        while self._dirty:
+            await asyncio.sleep(SAVE_DEBOUNCE_SECONDS)
+            if self._dirty:
+                self._dirty = False
+                await asyncio.to_thread(self._write_file, *self._serialize())
+
+    def flush(self):
+        """Write any pending changes to disk now (e.g. on shutdown)."""
+        if self._dirty:
+            self.save_database()
 
     def clear_database(self):
         """Empty the medicines list and save to file."""
         self.medicines = []
-        self.save_database()
+        self._rebuild_index()
+        self._mark_dirty()
+
+    # --- INDEXES ---
+    def _rebuild_index(self):
+        """Rebuild the lookups derived from self.medicines (search names, fuzzy name list, stock status, next id)."""
+        self._name_list = []
+        self._by_search_name = {}
+        self._by_id = {}
+        self._status = {}
+        self._low_stock_ids = set()
+        self._next_id = 1
+        self._find_cached.cache_clear()
+        for med in self.medicines:
+            self._index_medicine(med)
+
+    def _index_medicine(self, med: Dict):
+        """Add a medicine's processed name to the index (kept parallel to self.medicines)."""
+        self._name_list.append(utils.default_process(med['search_name']))
+        self._by_search_name.setdefault(med['search_name'], med)
+        self._by_id.setdefault(med['id'], med)
+        self._next_id = max(self._next_id, med['id'] + 1)
+        self._refresh_status(med)
+        self._find_cached.cache_clear()
+
+    def _refresh_status(self, med: Dict):
+        """Recompute the cached stock status; call after any change to stock or min_stock."""
+        self._status[med['id']] = self._compute_status(med)
+        if med['stock'] <= (med['min_stock'] * LOW_STOCK_THRESHOLD):
+            self._low_stock_ids.add(med['id'])
+        else:
+            self._low_stock_ids.discard(med['id'])
 
     # --- IMPORT OPERATIONS ---
     def import_from_dataframe(self, df: pd.DataFrame) -> Tuple[int, List[str]]:
@@ -56,31 +198,26 @@ class InventoryDatabase:
             'price': ['price', 'mrp', 'rate']
         }
         
-        actual_cols = {}
-        df_cols = [c.lower() for c in df.columns]
-        
-        for key, aliases in col_map.items():
-            for alias in aliases:
-                if alias in df_cols:
-                    # Find original case column name
-                    idx = df_cols.index(alias)
-                    actual_cols[key] = df.columns[idx]
-                    break
-        
+        actual_cols = self._resolve_columns(df, col_map)
         if 'name' not in actual_cols:
             return 0, ["Required column 'medicine_name' or 'name' not found."]
 
-        self.clear_database()
+        # Parse and build the new inventory on the side; self.medicines is only replaced once this succeeds
+        medicines = []
+        stocks = self._numeric_column(df, actual_cols.get('stock'), int)
+        min_stocks = self._numeric_column(df, actual_cols.get('min_stock'), int)
+        prices = self._numeric_column(df, actual_cols.get('price'), float, blank_ok=True)
+        now_iso = datetime.now().isoformat()
         
-        for index, row in df.iterrows():
+        for i, (index, raw_name) in enumerate(zip(df.index, df[actual_cols['name']])):
             try:
-                name = str(row[actual_cols['name']]).strip()
+                name = str(raw_name).strip()
                 if not name:
                     continue
                 
-                stock = int(row.get(actual_cols.get('stock'), 0))
-                min_stock = int(row.get(actual_cols.get('min_stock'), DEFAULT_MIN_STOCK))
-                price = float(row.get(actual_cols.get('price'), 0.0))
+                stock = self._numeric_cell(stocks, i, 0)
+                min_stock = self._numeric_cell(min_stocks, i, DEFAULT_MIN_STOCK)
+                price = self._numeric_cell(prices, i, 0.0)
                 
                 medicine_entry = {
                     'id': index + 1,
@@ -89,15 +226,17 @@ class InventoryDatabase:
                     'stock': stock,
                     'min_stock': min_stock,
                     'price': price,
-                    'created_at': datetime.now().isoformat(),
-                    'updated_at': datetime.now().isoformat()
+                    'created_at': now_iso,
+                    'updated_at': now_iso
                 }
-                self.medicines.append(medicine_entry)
+                medicines.append(medicine_entry)
                 success_count += 1
             except Exception as e:
                 errors.append(f"Row {index + 1}: {str(e)}")
         
-        self.save_database()
+        self.medicines = medicines
+        self._rebuild_index()
+        self._mark_dirty()
         return success_count, errors
 
     def restock_from_dataframe(self, df: pd.DataFrame) -> Tuple[int, int, List[str], List[Dict]]:
@@ -115,29 +254,38 @@ class InventoryDatabase:
             'price': ['price', 'mrp', 'rate']
         }
         
-        actual_cols = {}
-        df_cols = [c.lower() for c in df.columns]
-        
-        for key, aliases in col_map.items():
-            for alias in aliases:
-                if alias in df_cols:
-                    idx = df_cols.index(alias)
-                    actual_cols[key] = df.columns[idx]
-                    break
-        
+        actual_cols = self._resolve_columns(df, col_map)
         if 'name' not in actual_cols:
             return 0, 0, ["Required column 'medicine_name' or 'name' not found."], []
 
-        for index, row in df.iterrows():
+        stocks = self._numeric_column(df, actual_cols.get('stock'), int)
+        min_stocks = self._numeric_column(df, actual_cols.get('min_stock'), int)
+        prices = self._numeric_column(df, actual_cols.get('price'), float, blank_ok=True)
+        now_iso = datetime.now().isoformat()
+
+        # Match every row against the current inventory in one batch (fuzzy rows share one cdist call)
+        names = [str(name).strip() for name in df[actual_cols['name']]]
+        matches = self.find_medicines(names)
+        created: Dict[str, Dict] = {}
+
+        for i, (index, name_query) in enumerate(zip(df.index, names)):
             try:
-                name_query = str(row[actual_cols['name']]).strip()
                 if not name_query:
                     continue
                 
-                stock_to_add = int(row.get(actual_cols.get('stock'), 0))
+                # Read every number before touching the inventory so a bad cell skips the whole row
+                stock_to_add = self._numeric_cell(stocks, i, 0)
+                min_stock = self._numeric_cell(min_stocks, i, None)
+                price = self._numeric_cell(prices, i, None)
                 
-                # Try to find medicine in database
-                med, score = self.find_medicine(name_query)
+                # A repeat of a medicine created earlier in this file updates it rather than duplicating it
+                med = created.get(name_query.lower())
+                score = 100
+                if med is None:
+                    med, score = matches[i]
+                    # The batch ran before this file added any medicines; give those the priority find_medicine would
+                    if created:
+                        med, score = self._prefer_created(name_query.lower(), med, score, list(created.values()))
                 
                 if med and score >= 60:
                     # UPDATING EXISTING MEDICINE
@@ -145,12 +293,13 @@ class InventoryDatabase:
                     med['stock'] += stock_to_add
                     
                     # Optional updates
-                    if 'min_stock' in actual_cols:
-                        med['min_stock'] = int(row[actual_cols['min_stock']])
-                    if 'price' in actual_cols:
-                        med['price'] = float(row[actual_cols['price']])
+                    if min_stock is not None:
+                        med['min_stock'] = min_stock
+                    if price is not None:
+                        med['price'] = price
                         
-                    med['updated_at'] = datetime.now().isoformat()
+                    med['updated_at'] = now_iso
+                    self._refresh_status(med)
                     
                     updates_detail.append({
                         'name': med['name'],
@@ -162,21 +311,19 @@ class InventoryDatabase:
                     updated_count += 1
                 else:
                     # NEW MEDICINE ENTRY
-                    min_stock = int(row.get(actual_cols.get('min_stock'), DEFAULT_MIN_STOCK))
-                    price = float(row.get(actual_cols.get('price'), 0.0))
-                    
-                    new_id = max([m['id'] for m in self.medicines], default=0) + 1
                     new_med = {
-                        'id': new_id,
+                        'id': self._next_id,
                         'name': name_query,
                         'search_name': name_query.lower(),
                         'stock': stock_to_add,
-                        'min_stock': min_stock,
-                        'price': price,
-                        'created_at': datetime.now().isoformat(),
-                        'updated_at': datetime.now().isoformat()
+                        'min_stock': min_stock if min_stock is not None else DEFAULT_MIN_STOCK,
+                        'price': price if price is not None else 0.0,
+                        'created_at': now_iso,
+                        'updated_at': now_iso
                     }
                     self.medicines.append(new_med)
+                    self._index_medicine(new_med)
+                    created.setdefault(new_med['search_name'], new_med)
                     
                     updates_detail.append({
                         'name': name_query,
@@ -190,9 +337,78 @@ class InventoryDatabase:
             except Exception as e:
                 not_found.append(f"Row {index + 1}: {str(e)}")
         
-        self.save_database()
+        self._mark_dirty()
         return updated_count, new_count, not_found, updates_detail
 
+    def _prefer_created(self, query: str, med: Optional[Dict], score: int, new_meds: List[Dict]) -> Tuple[Optional[Dict], int]:
+        """Re-rank a batch match against medicines added earlier in the same restock file.
+
+        Follows find_medicine's order: prefix beats substring beats fuzzy, and older medicines win ties.
+        """
+        if med is not None and med['search_name'].startswith(query):
+            return med, score
+        batch_contains = med is not None and query in med['search_name']
+
+        contains = None
+        for new_med in new_meds:
+            if new_med['search_name'].startswith(query):
+                return new_med, 90
+            if contains is None and query in new_med['search_name']:
+                contains = new_med
+
+        if batch_contains:
+            return med, score
+        if contains is not None:
+            return contains, 80
+
+        # Neither matched by substring, so the batch score (if any) is fuzzy too
+        match = process.extractOne(
+            utils.default_process(query),
+            [utils.default_process(new_med['search_name']) for new_med in new_meds],
+            scorer=fuzz.token_sort_ratio,
+            processor=None,
+            score_cutoff=50
+        )
+        if match is not None and round(match[1]) > score:
+            return new_meds[match[2]], round(match[1])
+        return med, score
+
+    def _resolve_columns(self, df: pd.DataFrame, col_map: Dict[str, List[str]]) -> Dict[str, str]:
+        """Map each field to the original name of its first matching column (case-insensitive)."""
+        lower_cols = {}
+        for col in df.columns:
+            lower_cols.setdefault(str(col).lower(), col)
+
+        actual_cols = {}
+        for key, aliases in col_map.items():
+            for alias in aliases:
+                if alias in lower_cols:
+                    actual_cols[key] = lower_cols[alias]
+                    break
+        return actual_cols
+
+    def _numeric_column(self, df: pd.DataFrame, col: Optional[str], cast, blank_ok: bool = False) -> Optional[List]:
+        """Parse a whole column with pd.to_numeric; unparseable cells become None.
+
+        With blank_ok, empty cells become _MISSING (treated as absent) instead of invalid.
+        """
+        if col is None:
+            return None
+        values = pd.to_numeric(df[col], errors='coerce').tolist()
+        blanks = df[col].isna().tolist() if blank_ok else [False] * len(values)
+        return [
+            _MISSING if blank else cast(v) if math.isfinite(v) else None
+            for v, blank in zip(values, blanks)
+        ]
+
+    def _numeric_cell(self, values: Optional[List], i: int, default):
+        """Return row i of a parsed column, default if the column or an optional cell is absent; raise on an invalid cell."""
+        if values is None or values[i] is _MISSING:
+            return default
+        if values[i] is None:
+            raise ValueError("missing or non-numeric value")
+        return values[i]
+
     # --- SEARCH OPERATIONS ---
     def find_medicine(self, query: str) -> Tuple[Optional[Dict], int]:
         """Search medicine using exact, partial, or fuzzy matching."""
@@ -201,69 +417,142 @@ class InventoryDatabase:
             return None, 0
 
         # 1. Exact Match
-        for med in self.medicines:
-            if med['search_name'] == query:
-                return med, 100
+        med = self._by_search_name.get(query)
+        if med is not None:
+            return med, 100
+
+        idx, score = self._find_cached(query)
+        if idx is None:
+            return None, 0
+        return self.medicines[idx], score
 
+    def _match_index(self, query: str) -> Tuple[Optional[int], int]:
+        """Return (position in self.medicines, score) for a normalized, non-exact query; memoized per instance."""
         # 2. Partial Match (StartsWith or Contains)
-        for med in self.medicines:
-            if med['search_name'].startswith(query):
-                return med, 90
-        
-        for med in self.medicines:
-            if query in med['search_name']:
-                return med, 80
+        idx, score = self._match_partial(query)
+        if idx is not None:
+            return idx, score
 
-        # 3. Fuzzy Matching (50% threshold)
-        med_names = [med['search_name'] for med in self.medicines]
-        if not med_names:
+        # 3. Fuzzy Matching (50% threshold) against the pre-processed names
+        if not self._name_list:
             return None, 0
             
-        best_match, score = process.extractOne(query, med_names, scorer=fuzz.token_sort_ratio)
-        
-        if score >= 50:
-            for med in self.medicines:
-                if med['search_name'] == best_match:
-                    return med, score
-                    
+        match = process.extractOne(
+            utils.default_process(query), self._name_list,
+            scorer=fuzz.token_sort_ratio,
+            processor=None,
+            score_cutoff=50
+        )
+        if match is None:
+            return None, 0
+
+        _, score, idx = match
+        return idx, round(score)
+
+    def _match_partial(self, query: str) -> Tuple[Optional[int], int]:
+        """Return (position in self.medicines, score) of the first startswith, else first contains match."""
+        contains_idx = None
+        for idx, med in enumerate(self.medicines):
+            search_name = med['search_name']
+            if search_name.startswith(query):
+                return idx, 90
+            if contains_idx is None and query in search_name:
+                contains_idx = idx
+
+        if contains_idx is not None:
+            return contains_idx, 80
         return None, 0
 
+    def find_medicines(self, queries: List[str]) -> List[Tuple[Optional[Dict], int]]:
+        """Search several medicines at once, scoring all fuzzy fallbacks in a single batch."""
+        results: List[Tuple[Optional[Dict], int]] = [(None, 0)] * len(queries)
+        fuzzy_rows = []
+
+        for row, query in enumerate(queries):
+            query = query.lower().strip()
+            if not query:
+                continue
+
+            med = self._by_search_name.get(query)
+            if med is not None:
+                results[row] = (med, 100)
+                continue
+
+            idx, score = self._match_partial(query)
+            if idx is not None:
+                results[row] = (self.medicines[idx], score)
+            else:
+                fuzzy_rows.append((row, utils.default_process(query)))
+
+        if not fuzzy_rows or not self._name_list:
+            return results
+
+        # One N x M score matrix instead of N separate extractOne calls
+        scores = process.cdist(
+            [query for _, query in fuzzy_rows], self._name_list,
+            scorer=fuzz.token_sort_ratio,
+            processor=None,
+            score_cutoff=50,
+            workers=-1
+        )
+        for (row, _), row_scores in zip(fuzzy_rows, scores):
+            idx = int(row_scores.argmax())
+            score = float(row_scores[idx])
+            if score >= 50:
+                results[row] = (self.medicines[idx], round(score))
+
+        return results
+
     # --- STOCK OPERATIONS ---
     def update_stock(self, medicine_id: int, quantity: int, operation: str) -> Optional[Dict]:
         """Update stock levels and prevent negative values."""
-        for med in self.medicines:
-            if med['id'] == medicine_id:
-                if operation == 'sold':
-                    if med['stock'] < quantity:
-                        return None # Insufficient stock
-                    med['stock'] -= quantity
-                elif operation == 'bought':
-                    med['stock'] += quantity
-                
-                med['updated_at'] = datetime.now().isoformat()
-                self.save_database()
-                return med
-        return None
+        med = self._by_id.get(medicine_id)
+        if med is None:
+            return None
+
+        if operation == 'sold':
+            if med['stock'] < quantity:
+                return None # Insufficient stock
+            med['stock'] -= quantity
+        elif operation == 'bought':
+            med['stock'] += quantity
+        
+        med['updated_at'] = datetime.now().isoformat()
+        self._refresh_status(med)
+        self._mark_dirty()
+        return med
 
     # --- STATUS & REPORTING ---
     def get_all_medicines(self) -> List[Dict]:
         """Return all medicines."""
         return self.medicines
 
-    def get_low_stock_medicines(self) -> List[Dict]:
-        """Return medicines where stock <= min_stock * LOW_STOCK_THRESHOLD."""
-        low_stock = [
-            med for med in self.medicines 
-            if med['stock'] <= (med['min_stock'] * LOW_STOCK_THRESHOLD)
-        ]
-        return sorted(low_stock, key=lambda x: x['stock'])
+    def get_low_stock_medicines(self, limit: Optional[int] = None) -> List[Dict]:
+        """Return medicines where stock <= min_stock * LOW_STOCK_THRESHOLD, lowest stock first.
+
+        With a limit, only the `limit` lowest items are selected via a heap instead of a full sort.
+        """
+        low_stock = (self._by_id[med_id] for med_id in self._low_stock_ids)
+        key = lambda x: (x['stock'], x['id'])
+        if limit is not None:
+            return heapq.nsmallest(limit, low_stock, key=key)
+        return sorted(low_stock, key=key)
+
+    def get_low_stock_count(self) -> int:
+        """Return the number of low-stock medicines without building the list."""
+        return len(self._low_stock_ids)
 
     def get_critical_stock_medicines(self) -> List[Dict]:
         """Return medicines where stock <= CRITICAL_STOCK_THRESHOLD."""
-        return [med for med in self.medicines if med['stock'] <= CRITICAL_STOCK_THRESHOLD]
+        return [med for med in self.medicines if self._status.get(med['id']) == 'critical']
 
     def check_stock_status(self, medicine: Dict) -> str:
-        """Return status based on stock thresholds."""
+        """Return status based on stock thresholds, using the value cached at the last stock change."""
+        status = self._status.get(medicine['id'])
+        return status if status is not None else self._compute_status(medicine)
+
+    def _compute_status(self, medicine: Dict) -> str:
+        """Classify a medicine's stock against the configured thresholds."""
         stock = medicine['stock']
         min_stock = medicine['min_stock']
         
@@ -1,24 +1,42 @@
+import numpy as np
 import pandas as pd
+import io
 import os
+import threading
 from datetime import datetime, date
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from openpyxl import Workbook, load_workbook
 from config import TRANSACTIONS_DIR, REPORTS_DIR
 
+TRANSACTION_COLUMNS = ['Timestamp', 'Medicine Name', 'Quantity', 'Price', 'Type', 'Remaining Stock']
+
 class ExcelHandler:
     # --- INITIALIZATION ---
     def __init__(self):
         self.transactions_dir = TRANSACTIONS_DIR
         self.reports_dir = REPORTS_DIR
+        # Today's transaction workbook stays loaded so appends don't re-parse the file
+        self._wb: Optional[Workbook] = None
+        self._wb_date: Optional[date] = None
+        self._wb_path: Optional[str] = None
+        self._wb_lock = threading.Lock()
 
     # --- IMPORT OPERATIONS ---
-    def read_inventory_excel(self, file_path: str) -> pd.DataFrame:
-        """Read inventory from CSV or Excel file and clean column names."""
+    def read_inventory_excel(self, file_path: str, content: Optional[bytes] = None) -> pd.DataFrame:
+        """Read inventory from CSV or Excel file and clean column names.
+
+        If content is given (e.g. a Telegram download via download_as_bytearray),
+        it is parsed in memory and file_path is only used for its extension.
+        """
         ext = os.path.splitext(file_path)[1].lower()
+        source = io.BytesIO(content) if content is not None else file_path
         
         if ext == '.csv':
-            df = pd.read_csv(file_path)
+            df = pd.read_csv(source)
         elif ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(file_path)
+            # pandas already opens .xlsx read-only via openpyxl, and also handles stale
+            # sheet dimensions, blank leading rows and duplicate headers
+            df = pd.read_excel(source)
         else:
             raise ValueError("Unsupported file format. Please use .csv, .xlsx, or .xls")
         
@@ -37,30 +55,41 @@ class ExcelHandler:
         self.add_multiple_transactions([transaction])
 
     def add_multiple_transactions(self, transactions: List[Dict]):
-        """Add multiple transactions to today's Excel file efficiently."""
-        file_path = self.get_today_file_path()
+        """Append transactions to today's Excel file, reusing the loaded workbook."""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        new_data = []
-        for tx in transactions:
-            new_data.append({
-                'Timestamp': timestamp,
-                'Medicine Name': tx.get('medicine_name'),
-                'Quantity': tx.get('quantity'),
-                'Price': tx.get('price'),
-                'Type': tx.get('type', 'sold'),
-                'Remaining Stock': tx.get('remaining_stock')
-            })
-        
-        new_df = pd.DataFrame(new_data)
-        
+        with self._wb_lock:
+            wb = self._get_today_workbook()
+            ws = wb.active
+            for tx in transactions:
+                ws.append([
+                    timestamp,
+                    tx.get('medicine_name'),
+                    tx.get('quantity'),
+                    tx.get('price'),
+                    tx.get('type', 'sold'),
+                    tx.get('remaining_stock')
+                ])
+                
+            wb.save(self._wb_path)
+
+    def _get_today_workbook(self) -> Workbook:
+        """Return today's transaction workbook, loading or creating it once per day."""
+        today = date.today()
+        if self._wb is not None and self._wb_date == today:
+            return self._wb
+
+        file_path = self.get_today_file_path()
         if os.path.exists(file_path):
-            existing_df = pd.read_excel(file_path)
-            updated_df = pd.concat([existing_df, new_df], ignore_index=True)
+            wb = load_workbook(file_path)
         else:
-            updated_df = new_df
-            
-        updated_df.to_excel(file_path, index=False)
+            wb = Workbook()
+            ws = wb.active
+            ws.title = 'Sheet1'
+            ws.append(TRANSACTION_COLUMNS)
+        
+        self._wb, self._wb_date, self._wb_path = wb, today, file_path
+        return wb
 
     def get_today_transactions(self) -> Optional[str]:
         """Return path to today's transaction file if it exists."""
@@ -68,40 +97,34 @@ class ExcelHandler:
         return file_path if os.path.exists(file_path) else None
 
     # --- REPORT GENERATION ---
-    def generate_daily_report(self, medicines: List[Dict], transactions_file: Optional[str] = None) -> str:
-        """Generate a comprehensive multi-sheet daily Excel report."""
+    def generate_daily_report(self, medicines: List[Dict], transactions_file: Optional[str] = None) -> Tuple[str, Dict]:
+        """Generate a comprehensive multi-sheet daily Excel report.
+
+        Returns the report path and the summary metrics computed for it, so callers
+        don't have to re-read the transactions file.
+        """
         report_date = date.today().isoformat()
         file_path = os.path.join(self.reports_dir, f"daily_report_{report_date}.xlsx")
         
         with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-            # 1. Inventory Sheet
-            inv_data = []
-            total_stock_value = 0
-            low_stock_count = 0
+            # 1. Inventory Sheet (column-wise, no per-medicine Python loop)
+            inv_df = pd.DataFrame(medicines, columns=['name', 'stock', 'min_stock', 'price'])
+            inv_df.columns = ['Medicine Name', 'Current Stock', 'Min Stock', 'Price']
+            stock = inv_df['Current Stock']
+            inv_df['Stock Value'] = stock * inv_df['Price']
             
-            for med in medicines:
-                stock_value = med['stock'] * med['price']
-                total_stock_value += stock_value
-                
-                # Determine Status
-                status = "✓ OK"
-                if med['stock'] <= 5: # Critical threshold from config logic
-                    status = "🚨 CRITICAL"
-                    low_stock_count += 1
-                elif med['stock'] <= med['min_stock']:
-                    status = "⚠️ LOW"
-                    low_stock_count += 1
-                
-                inv_data.append({
-                    'Medicine Name': med['name'],
-                    'Current Stock': med['stock'],
-                    'Min Stock': med['min_stock'],
-                    'Price': med['price'],
-                    'Stock Value': stock_value,
-                    'Status': status
-                })
+            # Determine Status
+            is_critical = stock <= 5 # Critical threshold from config logic
+            is_low = stock <= inv_df['Min Stock']
+            inv_df['Status'] = np.select(
+                [is_critical, is_low],
+                ["🚨 CRITICAL", "⚠️ LOW"],
+                default="✓ OK"
+            )
+            needs_restock = is_critical | is_low
+            total_stock_value = inv_df['Stock Value'].sum()
+            low_stock_count = int(needs_restock.sum())
             
-            inv_df = pd.DataFrame(inv_data)
             inv_df.to_excel(writer, sheet_name='Inventory', index=False)
             
             # 2. Transactions Sheet
@@ -119,7 +142,7 @@ class ExcelHandler:
                 pd.DataFrame([{'Info': 'No transactions today'}]).to_excel(writer, sheet_name='Transactions', index=False)
 
             # 3. Low Stock Alert Sheet
-            low_stock_df = inv_df[inv_df['Status'].str.contains('LOW|CRITICAL')]
+            low_stock_df = inv_df.loc[needs_restock]
             low_stock_df.to_excel(writer, sheet_name='Low Stock Alert', index=False)
             
             # 4. Summary Sheet
@@ -144,7 +167,14 @@ class ExcelHandler:
             summary_df = pd.DataFrame(summary_data)
             summary_df.to_excel(writer, sheet_name='Summary', index=False)
 
-        return file_path
+        metrics = {
+            'total_products': len(medicines),
+            'total_stock_value': float(total_stock_value),
+            'low_stock_count': low_stock_count,
+            'today_sales_total': float(today_sales_total),
+            'today_items_sold': int(today_items_sold)
+        }
+        return file_path, metrics
 
     def generate_inventory_report(self, medicines: List[Dict]) -> str:
         """Generate a simple inventory-only Excel report."""
@@ -1,11 +1,37 @@
+import functools
 import re
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+# Pattern: medicine_name (can have spaces) space quantity (digits) space price (digits or decimals)
+SALES_PATTERN = re.compile(r'^(.+?)\s+(\d+)\s+([\d.]+)$')
+# Every sales line carries an integer quantity, so a message without any digit cannot be one
+_DIGIT_RE = re.compile(r'\d')
+
+@functools.lru_cache(maxsize=1024)
+def _parse_line(line: str) -> Optional[Tuple[str, int, float]]:
+    """Parse one line into (medicine_query, quantity, price); memoized since sellers repeat lines."""
+    match = SALES_PATTERN.match(line)
+    
+    if match:
+        return match.group(1).strip(), int(match.group(2)), float(match.group(3))
+    
+    # Fallback split method if regex fails (last two parts must be numbers)
+    parts = line.split()
+    if len(parts) >= 3:
+        try:
+            price = float(parts[-1])
+            quantity = int(parts[-2])
+            medicine_query = " ".join(parts[:-2])
+            return medicine_query.strip(), quantity, price
+        except (ValueError, IndexError):
+            return None
+            
+    return None
 
 class SalesParser:
     # --- INITIALIZATION ---
     def __init__(self):
-        # Pattern: medicine_name (can have spaces) space quantity (digits) space price (digits or decimals)
-        self.sales_pattern = re.compile(r'^(.+?)\s+(\d+)\s+([\d.]+)$')
+        self.sales_pattern = SALES_PATTERN
 
     # --- SALES PARSING ---
     def parse_sales_message(self, message: str) -> List[Dict]:
@@ -26,39 +52,27 @@ class SalesParser:
 
     def parse_single_line(self, line: str) -> Optional[Dict]:
         """Attempt to parse a single line into medicine_query, quantity, and price."""
-        match = self.sales_pattern.match(line)
-        
-        if match:
-            return {
-                'medicine_query': match.group(1).strip(),
-                'quantity': int(match.group(2)),
-                'price': float(match.group(3))
-            }
+        parsed = _parse_line(line)
+        if parsed is None:
+            return None
         
-        # Fallback split method if regex fails (last two parts must be numbers)
-        parts = line.split()
-        if len(parts) >= 3:
-            try:
-                price = float(parts[-1])
-                quantity = int(parts[-2])
-                medicine_query = " ".join(parts[:-2])
-                return {
-                    'medicine_query': medicine_query.strip(),
-                    'quantity': quantity,
-                    'price': price
-                }
-            except (ValueError, IndexError):
-                return None
-                
-        return None
+        # Fresh dict per call so callers can't mutate the cached result
+        medicine_query, quantity, price = parsed
+        return {
+            'medicine_query': medicine_query,
+            'quantity': quantity,
+            'price': price
+        }
 
     def is_sales_message(self, message: str) -> bool:
-        """Return True if at least one line can be correctly parsed as a sales entry."""
-        lines = message.strip().split('\n')
-        for line in lines:
-            if line.strip() and self.parse_single_line(line.strip()):
-                return True
-        return False
+        """Return True if at least one line matches the sales pattern (no split fallback)."""
+        if not _DIGIT_RE.search(message):
+            return False
+
+        return any(
+            self.sales_pattern.match(line.strip())
+            for line in message.strip().split('\n')
+        )
 
 class CommandParser:
     # --- COMMAND KEYWORDS ---
@@ -70,15 +84,11 @@ class CommandParser:
         'help': ['help', 'madad', 'commands', '?'],
         'upload': ['upload', 'import', 'excel']
     }
+    # keyword -> command; built in reverse so the first command listing a keyword wins
+    _KEYWORD_INDEX = {kw: cmd for cmd, kws in reversed(COMMANDS.items()) for kw in kws}
 
     # --- COMMAND PARSING ---
     def parse_command(self, message: str) -> Optional[str]:
         """Convert message to lowercase and match against defined command keywords."""
         msg = message.lower().strip()
-        
-        # Exact match or keyword inclusion
-        for command, keywords in self.COMMANDS.items():
-            if msg in keywords:
-                return command
-                
-        return None
+        return self._KEYWORD_INDEX.get(msg)
@@ -1,11 +1,14 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
+import asyncio
+import logging
 import pytz
-import pandas as pd
 import os
 from config import DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE, TIMEZONE, AUTHORIZED_USERS
 
+logger = logging.getLogger(__name__)
+
 class ReportScheduler:
     # --- INITIALIZATION ---
     def __init__(self):
@@ -24,34 +27,34 @@ class ReportScheduler:
     async def send_daily_report(self):
         """Generate and send the daily report to all authorized users."""
         if not all([self.bot, self.db, self.excel_handler]):
-            print("Scheduler Error: Components not configured.")
+            logger.error("Scheduler Error: Components not configured.")
             return
 
         try:
-            # 1. Gather Data
-            medicines = self.db.get_all_medicines()
+            # 1. Gather Data (Excel work runs in a thread to keep the event loop free)
+            medicines = list(self.db.get_all_medicines())
             tx_file = self.excel_handler.get_today_transactions()
-            report_path = self.excel_handler.generate_daily_report(medicines, tx_file)
+            report_path, metrics = await asyncio.to_thread(
+                self.excel_handler.generate_daily_report, medicines, tx_file
+            )
             
-            # 2. Calculate Brief Summary
-            today_sales_total = 0
-            if tx_file and os.path.exists(tx_file):
-                tx_df = pd.read_excel(tx_file)
-                sold_df = tx_df[tx_df['Type'] == 'sold']
-                today_sales_total = (sold_df['Quantity'] * sold_df['Price']).sum()
-
-            low_stock_items = self.db.get_low_stock_medicines()
+            # 2. Brief Summary (sales totals come from the report, not a second Excel read)
+            today_sales_total = metrics['today_sales_total']
+            low_stock_count = self.db.get_low_stock_count()
             report_date = datetime.now().strftime("%Y-%m-%d")
 
             summary_msg = (
                 f"📊 *Daily Inventory Report: {report_date}*\n\n"
                 f"💰 Today's Total Sales: ₹{today_sales_total:,.2f}\n"
-                f"📦 Total Products in DB: {len(medicines)}\n"
-                f"⚠️ Low Stock Items: {len(low_stock_items)}\n\n"
+                f"📦 Total Products in DB: {metrics['total_products']}\n"
+                f"⚠️ Low Stock Items: {low_stock_count}\n\n"
                 f"Please find the detailed report attached below."
             )
 
             # 3. Send to Authorized Users
+            with open(report_path, 'rb') as f:
+                report_bytes = await asyncio.to_thread(f.read)
+
             for user_id in AUTHORIZED_USERS:
                 try:
                     # Send message
@@ -61,17 +64,16 @@ class ReportScheduler:
                         parse_mode='Markdown'
                     )
                     # Send Excel file
-                    with open(report_path, 'rb') as f:
-                        await self.bot.send_document(
-                            chat_id=user_id,
-                            document=f,
-                            filename=os.path.basename(report_path)
-                        )
+                    await self.bot.send_document(
+                        chat_id=user_id,
+                        document=report_bytes,
+                        filename=os.path.basename(report_path)
+                    )
                 except Exception as e:
-                    print(f"Error sending report to user {user_id}: {str(e)}")
+                    logger.error("Error sending report to user %s: %s", user_id, e)
 
         except Exception as e:
-            print(f"Critial status in scheduled report: {str(e)}")
+            logger.exception("Critical error in scheduled report: %s", e)
 
     # --- SCHEDULER CONTROL ---
     def start(self):
@@ -89,9 +91,9 @@ class ReportScheduler:
         )
         
         self.scheduler.start()
-        print(f"Scheduler started: Daily report set for {DAILY_REPORT_HOUR:02d}:{DAILY_REPORT_MINUTE:02d}")
+        logger.info("Scheduler started: Daily report set for %02d:%02d", DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE)
 
     def stop(self):
         """Shut down the scheduler."""
         self.scheduler.shutdown()
-        print("Scheduler stopped.")
+        logger.info("Scheduler stopped.")